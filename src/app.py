@@ -1,34 +1,66 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response
+from starlette.middleware.gzip import GZipMiddleware
 from prometheus_fastapi_instrumentator import Instrumentator
 import logging
 from datetime import datetime, UTC
-import psycopg2
-from psycopg2.extras import RealDictCursor, Json
+import asyncpg
 import os
-import uuid
+import time
+import hashlib
+import itertools
+import secrets
 import json
-import redis
-from pythonjsonlogger.json import JsonFormatter
+import asyncio
+import orjson
+import zstandard as zstd
+import redis.asyncio as redis
 from contextvars import ContextVar
+from contextlib import asynccontextmanager
+from collections import defaultdict
 
 # Context variable for request ID
 request_id_context: ContextVar[str | None] = ContextVar("request_id", default=None)
 
+# Request IDs are a per-process random nonce plus a counter - unique across
+# replicas without an os.urandom call per request
+PROC_NONCE = secrets.token_hex(4)
+_request_counter = itertools.count()
+
+# Attributes every LogRecord has - anything else was passed via extra=
+_LOG_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
 # Configure JSON structured logging
-class CustomJsonFormatter(JsonFormatter):
-    def add_fields(self, log_data, record, message_dict):
-        super(CustomJsonFormatter, self).add_fields(log_data, record, message_dict)
-        log_data['timestamp'] = datetime.now(UTC).isoformat()
-        log_data['level'] = record.levelname
-        log_data['logger'] = record.name
+class FastJsonFormatter(logging.Formatter):
+    """Render each record as one JSON line with orjson"""
+    def format(self, record):
+        log_data = {
+            "timestamp": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
         # Add request_id if available
         request_id = request_id_context.get()
         if request_id:
-            log_data['request_id'] = request_id
+            log_data["request_id"] = request_id
+        # Add fields passed via extra=
+        for key, value in record.__dict__.items():
+            if key not in _LOG_RECORD_ATTRS:
+                log_data[key] = value
+        if record.exc_info:
+            log_data["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(log_data, default=str).decode()
+
+# Skip record fields the formatter never emits (thread/process lookups, caller frame walk)
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+logging._srcfile = None
 
 # Setup JSON logging
 log_handler = logging.StreamHandler()
-formatter = CustomJsonFormatter('%(timestamp)s %(level)s %(name)s %(message)s')
+formatter = FastJsonFormatter()
 log_handler.setFormatter(formatter)
 
 logger = logging.getLogger(__name__)
@@ -36,161 +68,475 @@ logger.addHandler(log_handler)
 logger.setLevel(logging.INFO)
 logger.propagate = False
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the database pool on startup and close connections on shutdown"""
+    global db_pool, redis_client
+    await get_db_pool()
+    yield
+    if db_pool is not None:
+        await db_pool.close()
+        db_pool = None
+    if redis_client is not None:
+        await redis_client.aclose()
+        redis_client = None
+
 app = FastAPI(
     title="DevOps Assessment API",
     description="Demo application for DevOps technical assessment",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Probe and scrape endpoints are the highest-QPS and least interesting, so
+# they skip both the access log and per-request instrumentation
+UNTRACKED_PATHS = ("/health", "/metrics")
+
 # Request ID middleware for distributed tracing
 @app.middleware("http")
 async def request_id_middleware(request: Request, call_next):
-    """Add unique request ID to each request for tracing"""
-    request_id = request.headers.get("X-Request-ID", str(uuid.uuid4()))
+    """Add unique request ID to each request and emit one access log line"""
+    request_id = request.headers.get("X-Request-ID") or f"{PROC_NONCE}{next(_request_counter):012x}"
     request_id_context.set(request_id)
+    start = time.perf_counter()
+    # Stays 500 if the handler raises, so failed requests are logged too
+    status = 500
+
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        path = request.url.path
+        if path not in UNTRACKED_PATHS:
+            # Handlers report cache outcome via request.state instead of logging themselves
+            logger.info("request", extra={
+                "method": request.method,
+                "path": path,
+                "status": status,
+                "dur_ms": round((time.perf_counter() - start) * 1000, 2),
+                "cache": getattr(request.state, "cache", None)
+            })
 
-    response = await call_next(request)
-    response.headers["X-Request-ID"] = request_id
-    return response
+# Compress large responses for clients that don't accept zstd
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 # Prometheus metrics
-Instrumentator().instrument(app).expose(app)
+Instrumentator(
+    excluded_handlers=list(UNTRACKED_PATHS),
+    should_group_status_codes=True,
+    should_ignore_untemplated=True
+).instrument(app).expose(app, include_in_schema=False)
 
-# Database connection
+# Database connection pool
 DATABASE_URL = os.getenv("DATABASE_URL", "")
-db_conn = None
+# Pool is per worker process - total connections = workers x replicas x max size
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "20"))
+# Seconds to wait for each connection, so an outage yields a quick 503
+DB_CONNECT_TIMEOUT = 5
+db_pool = None
+_db_pool_lock = asyncio.Lock()
+# Bumped on every failed creation attempt; callers that queued behind one
+# share its outcome instead of retrying one after another
+_db_pool_failures = 0
 
 # Redis connection
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+REDIS_MAX_CONNECTIONS = 32
+# Seconds a request waits for a free pooled connection before giving up
+REDIS_POOL_TIMEOUT = 2
 redis_client = None
+DATA_CACHE_PREFIX = "data:"
+# Per-key locks coalescing concurrent cache misses within this process
+_cache_locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+# Coroutines holding or waiting on each lock; a lock is only dropped at zero
+_cache_lock_refs: defaultdict[str, int] = defaultdict(int)
+# Cached pages are stored as hex ETag digest + zstd-compressed body
+ETAG_DIGEST_SIZE = 16
+ZSTD_LEVEL = 3
+# Pages at least this large are (de)compressed in a worker thread
+ZSTD_THREAD_MIN_SIZE = 128 * 1024
+_zstd_compressor = zstd.ZstdCompressor(level=ZSTD_LEVEL)
+_zstd_decompressor = zstd.ZstdDecompressor()
 
-def get_redis_connection():
+async def get_redis_connection():
     """Get Redis connection with retry logic"""
     global redis_client
     if redis_client is None:
         try:
-            redis_client = redis.from_url(REDIS_URL, decode_responses=True)
-            if redis_client is not None:
-                redis_client.ping()
-                logger.info("Connected to Redis")
+            # A blocking pool makes bursts queue for a connection instead of
+            # failing, which would turn cache hits and invalidations into errors
+            pool = redis.BlockingConnectionPool.from_url(
+                REDIS_URL,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                timeout=REDIS_POOL_TIMEOUT,
+                # Values stay as bytes so cached bodies pass straight to Response
+                decode_responses=False
+            )
+            redis_client = redis.Redis.from_pool(pool)
+            await redis_client.ping()
+            logger.info("Connected to Redis")
         except Exception as e:
-            logger.warning(f"Redis connection failed: {e}")
+            logger.warning("Redis connection failed: %s", e)
+            if redis_client is not None:
+                await redis_client.aclose()
             redis_client = None
     return redis_client
 
-def get_db_connection():
-    """Get database connection with retry logic"""
-    global db_conn
-    if db_conn is None or db_conn.closed:
+async def init_db_connection(conn):
+    """Register JSONB codec so content round-trips as Python objects"""
+    await conn.set_type_codec(
+        "jsonb",
+        encoder=json.dumps,
+        decoder=json.loads,
+        schema="pg_catalog"
+    )
+
+async def get_db_pool():
+    """Get database connection pool with retry logic"""
+    global db_pool, _db_pool_failures
+    if db_pool is not None:
+        return db_pool
+    failures = _db_pool_failures
+    # Serialize creation so a burst of requests after an outage builds one pool
+    async with _db_pool_lock:
+        if db_pool is not None or _db_pool_failures != failures:
+            return db_pool
+        pool = None
         try:
-            db_conn = psycopg2.connect(DATABASE_URL)
+            pool = await asyncpg.create_pool(
+                DATABASE_URL,
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                timeout=DB_CONNECT_TIMEOUT,
+                init=init_db_connection
+            )
             logger.info("Connected to PostgreSQL database")
             # Create table if it doesn't exist
-            with db_conn.cursor() as cur:
-                cur.execute("""
+            async with pool.acquire() as conn:
+                await conn.execute("""
                     CREATE TABLE IF NOT EXISTS data_items (
                         id SERIAL PRIMARY KEY,
                         content JSONB NOT NULL,
                         timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     )
                 """)
-                db_conn.commit()
+                # jsonb_path_ops only supports @> but is smaller and faster than jsonb_ops
+                await conn.execute("""
+                    CREATE INDEX IF NOT EXISTS data_items_content_gin
+                    ON data_items USING GIN (content jsonb_path_ops)
+                """)
+            db_pool = pool
         except Exception as e:
-            logger.error(f"Database connection failed: {e}")
-            db_conn = None
-    return db_conn
+            logger.error("Database connection failed: %s", e)
+            _db_pool_failures += 1
+            if pool is not None:
+                await pool.close()
+    return db_pool
+
+# One page of data_items as the complete /data response body; a short page
+# means there is nothing left to fetch, so next_cursor is null. Returned as
+# UTF-8 bytea so the body reaches Redis and the client without a str round-trip
+PAGE_QUERY = """
+    SELECT convert_to(json_build_object(
+        'count', count(*),
+        'data', coalesce(json_agg(page ORDER BY page.id), '[]'::json),
+        'next_cursor', CASE WHEN count(*) = $2 THEN max(page.id) END
+    )::text, 'UTF8')
+    FROM (
+        SELECT id, content, timestamp FROM data_items
+        WHERE id > $1{where}
+        ORDER BY id LIMIT $2
+    ) page
+"""
+
+# asyncpg prepares each statement once per connection and reuses it from its
+# statement cache, keyed by SQL text - keep the text fixed, never interpolated
+SELECT_PAGE_SQL = PAGE_QUERY.format(where="")
+SELECT_FILTERED_PAGE_SQL = PAGE_QUERY.format(where=" AND content @> $3")
+# The created row comes back already rendered as the JSON response body
+INSERT_ITEM_SQL = """
+    INSERT INTO data_items (content) VALUES ($1)
+    RETURNING convert_to(json_build_object(
+        'id', id, 'content', content, 'timestamp', timestamp
+    )::text, 'UTF8')
+"""
+INSERT_ITEMS_SQL = "INSERT INTO data_items (content) SELECT unnest($1::jsonb[]) RETURNING id"
+
+async def invalidate_data_cache(redis_conn):
+    """Drop every cached /data page"""
+    keys = [key async for key in redis_conn.scan_iter(match=f"{DATA_CACHE_PREFIX}*")]
+    if keys:
+        await redis_conn.delete(*keys)
+
+# Serialized /health body, rebuilt at most once per second rather than per probe
+_HEALTH_CACHE = {"ts": float("-inf"), "body": b""}
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint for k8s probes"""
-    return {
-        "status": "healthy",
-        "timestamp": datetime.now(UTC).isoformat(),
-        "service": "devops-assessment-api"
-    }
+    now = time.monotonic()
+    if now - _HEALTH_CACHE["ts"] > 1.0:
+        _HEALTH_CACHE.update(ts=now, body=json.dumps({
+            "status": "healthy",
+            "timestamp": datetime.now(UTC).isoformat(),
+            "service": "devops-assessment-api"
+        }, separators=(",", ":")).encode())
+    return Response(content=_HEALTH_CACHE["body"], media_type="application/json")
 
 @app.get("/data")
-async def get_data():
-    """Retrieve all stored data from PostgreSQL with Redis caching"""
-    CACHE_KEY = "data:all"
+async def get_data(
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000),
+    after_id: int = Query(0, ge=0),
+    content_filter: str | None = Query(None, alias="filter")
+):
+    """Retrieve a page of stored data from PostgreSQL with Redis caching
+
+    Keyset pagination: pass the returned `next_cursor` as `after_id` to
+    fetch the next page. Optional `filter` is a JSON object matched
+    against content with JSONB containment (@>), e.g. ?filter={"type": "order"}.
+    """
+    CACHE_KEY = f"{DATA_CACHE_PREFIX}{after_id}:{limit}"
     CACHE_TTL = 60  # Cache for 60 seconds
 
-    # Try to get from cache first
-    redis_conn = get_redis_connection()
-    if redis_conn:
+    if content_filter is not None:
         try:
-            cached_data = redis_conn.get(CACHE_KEY)
-            if cached_data:
-                logger.info("GET /data - Cache HIT")
-                return json.loads(cached_data)
-        except Exception as e:
-            logger.warning(f"Redis read error: {e}")
+            content_filter = json.loads(content_filter)
+        except ValueError:
+            content_filter = None
+        if not isinstance(content_filter, dict):
+            raise HTTPException(status_code=400, detail="Filter must be a JSON object")
 
-    # Cache miss - fetch from database
-    logger.info("GET /data - Cache MISS, fetching from database")
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(status_code=503, detail="Database connection unavailable")
+    # Only unfiltered pages are cached - filters would make the keyspace unbounded
+    redis_conn = await get_redis_connection() if content_filter is None else None
+    if not redis_conn:
+        request.state.cache = "BYPASS"
+        body = await fetch_data_page(after_id, limit, content_filter)
+        return await conditional_json_response(request, page_etag(body), body=body)
+
+    # Try to get from cache first
+    cached_data = await read_cached_page(redis_conn, CACHE_KEY)
+    if cached_data:
+        # Cached entry already holds the ETag and compressed body - no hashing
+        # or re-serialization on a hit
+        response = await cached_page_response(request, cached_data)
+        if response is not None:
+            request.state.cache = "HIT"
+            return response
 
+    # Single-flight: on a miss only one coroutine per key queries Postgres,
+    # the others wait on the lock and then find its result in Redis
+    lock = _cache_locks[CACHE_KEY]
+    _cache_lock_refs[CACHE_KEY] += 1
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT id, content, timestamp FROM data_items ORDER BY id")
-            items = cur.fetchall()
+        async with lock:
+            cached_data = await read_cached_page(redis_conn, CACHE_KEY)
+            if cached_data:
+                response = await cached_page_response(request, cached_data)
+                if response is not None:
+                    request.state.cache = "HIT"
+                    return response
 
-        result = {
-            "count": len(items),
-            "data": [dict(item) for item in items]
-        }
+            request.state.cache = "MISS"
+            body = await fetch_data_page(after_id, limit, content_filter)
+            etag_digest = page_etag(body)
+            compressed = await compress_page(body)
 
-        # Cache the result
-        if redis_conn:
+            # Cache the result
             try:
-                redis_conn.setex(CACHE_KEY, CACHE_TTL, json.dumps(result, default=str))
-                logger.info(f"GET /data - Cached {len(items)} items for {CACHE_TTL}s")
+                await redis_conn.setex(CACHE_KEY, CACHE_TTL, etag_digest.encode() + compressed)
             except Exception as e:
-                logger.warning(f"Redis write error: {e}")
+                logger.warning("Redis write error: %s", e)
+    finally:
+        # Drop the lock once nobody holds or awaits it so per-page keys don't
+        # accumulate; lock.locked() alone is False while waiters are queued
+        _cache_lock_refs[CACHE_KEY] -= 1
+        if not _cache_lock_refs[CACHE_KEY]:
+            del _cache_lock_refs[CACHE_KEY]
+            if _cache_locks.get(CACHE_KEY) is lock:
+                del _cache_locks[CACHE_KEY]
+
+    return await conditional_json_response(request, etag_digest, body=body, compressed=compressed)
+
+def page_etag(body):
+    """Hash a page body for its ETag
+
+    Hashing the body rather than counting writes keeps the ETag correct
+    across replicas and for writes made outside this process.
+    """
+    return hashlib.blake2b(body, digest_size=ETAG_DIGEST_SIZE).hexdigest()
+
+def split_cache_entry(entry):
+    """Split a cached page into its ETag digest and zstd-compressed body
+
+    Raises ValueError or zstd.ZstdError if the entry is malformed.
+    """
+    digest_length = ETAG_DIGEST_SIZE * 2
+    if len(entry) <= digest_length:
+        raise ValueError(f"cache entry too short ({len(entry)} bytes)")
+    etag_digest, compressed = entry[:digest_length].decode("ascii"), entry[digest_length:]
+    # Checks the frame header, so garbage is caught before it is passed
+    # through to zstd clients unchanged
+    zstd.frame_content_size(compressed)
+    return etag_digest, compressed
+
+async def cached_page_response(request, entry):
+    """Build the response for a cached page, or None if it can't be decoded
 
-        return result
+    A corrupt entry is treated as a miss so the page is rebuilt from the
+    database rather than failing every request until the TTL expires.
+    """
+    try:
+        etag_digest, compressed = split_cache_entry(entry)
+        return await conditional_json_response(request, etag_digest, compressed=compressed)
+    except (ValueError, zstd.ZstdError) as e:
+        logger.warning("Redis cache decode error: %s", e)
+        return None
+
+async def compress_page(body):
+    """zstd-compress a page, off the event loop when it is large"""
+    if len(body) < ZSTD_THREAD_MIN_SIZE:
+        return _zstd_compressor.compress(body)
+    # zstandard releases the GIL but its contexts aren't thread-safe,
+    # so each worker thread gets its own
+    return await asyncio.to_thread(zstd.ZstdCompressor(level=ZSTD_LEVEL).compress, body)
+
+async def decompress_page(compressed):
+    """Decompress a cached page, off the event loop when it is large"""
+    # Size check uses the decompressed size recorded in the frame header
+    if zstd.frame_content_size(compressed) < ZSTD_THREAD_MIN_SIZE:
+        return _zstd_decompressor.decompress(compressed)
+    return await asyncio.to_thread(zstd.ZstdDecompressor().decompress, compressed)
+
+def accepts_zstd(accept_encoding):
+    """Whether an Accept-Encoding header allows zstd, honouring q-values"""
+    qualities = {}
+    for coding in accept_encoding.split(","):
+        name, *params = coding.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    # An explicit zstd entry overrides the wildcard, e.g. "*, zstd;q=0"
+    return qualities.get("zstd", qualities.get("*", 0.0)) > 0
+
+async def conditional_json_response(request, etag_digest, body=None, compressed=None):
+    """Return a JSON page, zstd-encoded if the client accepts it, or 304
+
+    Either body or compressed must be given; the body is only decompressed
+    when the client can't take zstd.
+    """
+    # Weak ETag - the same page may be sent with different content codings
+    etag = f'W/"{etag_digest}"'
+    # Clients and proxies may store the page but must revalidate before reuse,
+    # so a POST is visible on the next request; the coding depends on
+    # Accept-Encoding, so shared caches must key on it for every response
+    headers = {"ETag": etag, "Cache-Control": "public, no-cache", "Vary": "Accept-Encoding"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        client_etags = {tag.strip() for tag in if_none_match.split(",")}
+        if etag in client_etags or "*" in client_etags:
+            return Response(status_code=304, headers=headers)
+
+    if compressed is not None and accepts_zstd(request.headers.get("accept-encoding", "")):
+        headers["Content-Encoding"] = "zstd"
+        return Response(content=compressed, media_type="application/json", headers=headers)
+
+    if body is None:
+        body = await decompress_page(compressed)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def read_cached_page(redis_conn, key):
+    """Read a cached /data page, treating Redis errors as a miss"""
+    try:
+        return await redis_conn.get(key)
+    except Exception as e:
+        logger.warning("Redis read error: %s", e)
+        return None
+
+async def fetch_data_page(after_id, limit, content_filter):
+    """Fetch one /data page from PostgreSQL as JSON-encoded bytes"""
+    pool = await get_db_pool()
+    if not pool:
+        raise HTTPException(status_code=503, detail="Database connection unavailable")
+
+    try:
+        async with pool.acquire() as conn:
+            # Postgres renders the whole page as one JSON document, so rows are
+            # never materialized as Python objects
+            if content_filter is None:
+                return await conn.fetchval(SELECT_PAGE_SQL, after_id, limit)
+            return await conn.fetchval(
+                SELECT_FILTERED_PAGE_SQL,
+                after_id, limit, content_filter
+            )
     except Exception as e:
-        logger.error(f"GET /data - Error: {e}")
+        logger.error("GET /data - Error: %s", e)
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.post("/data")
 async def create_data(item: dict):
     """Store new data item in PostgreSQL and invalidate cache"""
-    CACHE_KEY = "data:all"
-
     if not item:
         raise HTTPException(status_code=400, detail="Empty data not allowed")
 
-    conn = get_db_connection()
-    if not conn:
+    pool = await get_db_pool()
+    if not pool:
         raise HTTPException(status_code=503, detail="Database connection unavailable")
 
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                "INSERT INTO data_items (content) VALUES (%s) RETURNING id, content, timestamp",
-                (Json(item),)
-            )
-            result = cur.fetchone()
-            conn.commit()
+        async with pool.acquire() as conn:
+            result = await conn.fetchval(INSERT_ITEM_SQL, item)
 
         if result is None:
             raise HTTPException(status_code=500, detail="Failed to create data item")
 
         # Invalidate cache after successful write
-        redis_conn = get_redis_connection()
+        redis_conn = await get_redis_connection()
+        if redis_conn:
+            try:
+                await invalidate_data_cache(redis_conn)
+            except Exception as e:
+                logger.warning("Redis delete error: %s", e)
+
+        return Response(content=result, media_type="application/json")
+    except Exception as e:
+        logger.error("POST /data - Error: %s", e)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@app.post("/data/bulk")
+async def create_data_bulk(items: list[dict]):
+    """Store many data items in one round-trip and invalidate cache once"""
+    if not items or not all(items):
+        raise HTTPException(status_code=400, detail="Empty data not allowed")
+
+    pool = await get_db_pool()
+    if not pool:
+        raise HTTPException(status_code=503, detail="Database connection unavailable")
+
+    try:
+        # Single INSERT over an unnested array - COPY can't use the text-format JSONB codec
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(INSERT_ITEMS_SQL, items)
+
+        # Invalidate cache after successful write
+        redis_conn = await get_redis_connection()
         if redis_conn:
             try:
-                redis_conn.delete(CACHE_KEY)
-                logger.info("POST /data - Cache invalidated")
+                await invalidate_data_cache(redis_conn)
             except Exception as e:
-                logger.warning(f"Redis delete error: {e}")
+                logger.warning("Redis delete error: %s", e)
 
-        logger.info(f"POST /data - Created item with ID {result['id']}")
-        return dict(result)
+        return {"count": len(rows), "ids": [row["id"] for row in rows]}
     except Exception as e:
-        conn.rollback()
-        logger.error(f"POST /data - Error: {e}")
+        logger.error("POST /data/bulk - Error: %s", e)
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
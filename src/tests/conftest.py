@@ -0,0 +1,9 @@
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+from src.app import app
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def client():
+    """Async client shared by the whole session - the app is built once"""
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+        yield c
@@ -1,26 +1,48 @@
+import json
 import pytest
-from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
-from src.app import app
-
-client = TestClient(app)
+import zstandard
+from unittest.mock import patch, MagicMock, AsyncMock
+from src.app import app, INSERT_ITEM_SQL
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+ONE_ITEM_PAGE = (
+    b'{"count": 1, "data": [{"id": 1, "content": {"test": "data"}, "timestamp": "2024-01-01"}],'
+    b' "next_cursor": null}'
+)
+
+def created_row(item_id, content):
+    """Build the JSON body INSERT_ITEM_SQL returns for a created row"""
+    body = json.dumps({"id": item_id, "content": content, "timestamp": "2024-01-01T00:00:00"})
+    return body.encode()
+
+def mock_redis_client(keys=("data:0:100",)):
+    """Build an async Redis client mock whose scan_iter yields the given keys"""
+    redis_conn = MagicMock()
+    redis_conn.get = AsyncMock(return_value=None)
+    redis_conn.setex = AsyncMock()
+    redis_conn.delete = AsyncMock()
+    redis_conn.scan_iter.return_value.__aiter__.return_value = list(keys)
+    return redis_conn
 
 @pytest.fixture
 def mock_db():
-    """Mock database connection for testing"""
-    with patch('src.app.get_db_connection') as mock:
+    """Mock database connection pool for testing"""
+    with patch('src.app.get_db_pool', new_callable=AsyncMock) as mock:
+        pool = MagicMock()
         conn = MagicMock()
-        cursor = MagicMock()
-        conn.cursor.return_value.__enter__.return_value = cursor
-        mock.return_value = conn
-        yield cursor, conn
+        conn.fetchval = AsyncMock()
+        conn.fetch = AsyncMock()
+        pool.acquire.return_value.__aenter__.return_value = conn
+        mock.return_value = pool
+        yield conn, pool
 
-def test_get_data_empty(mock_db):
+async def test_get_data_empty(client, mock_db):
     """Test GET /data returns empty list initially"""
-    cursor, conn = mock_db
-    cursor.fetchall.return_value = []
+    conn, pool = mock_db
+    conn.fetchval.return_value = b'{"count": 0, "data": [], "next_cursor": null}'
 
-    response = client.get("/data")
+    response = await client.get("/data")
     assert response.status_code == 200
     data = response.json()
     assert "count" in data
@@ -28,229 +50,717 @@ def test_get_data_empty(mock_db):
     assert isinstance(data["data"], list)
     assert data["count"] == 0
 
-def test_post_data_success(mock_db):
+async def test_get_data_pagination(client, mock_db):
+    """Test GET /data returns a keyset page and cursor for the next one"""
+    conn, pool = mock_db
+    conn.fetchval.return_value = (
+        b'{"count": 2, "data": [{"id": 11, "content": {"n": 1}, "timestamp": "2024-01-01"},'
+        b' {"id": 12, "content": {"n": 2}, "timestamp": "2024-01-01"}], "next_cursor": 12}'
+    )
+
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+        redis_conn = mock_redis_client()
+        redis_conn.get.return_value = None
+        mock_redis.return_value = redis_conn
+
+        response = await client.get("/data", params={"limit": 2, "after_id": 10})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["count"] == 2
+        assert data["next_cursor"] == 12
+        # Fixed SQL text so asyncpg reuses the connection's prepared statement
+        from src.app import SELECT_PAGE_SQL
+        assert conn.fetchval.call_args[0] == (SELECT_PAGE_SQL, 10, 2)
+        redis_conn.get.assert_called_with("data:10:2")
+
+async def test_get_data_invalid_limit(client):
+    """Test GET /data rejects out-of-range page sizes"""
+    for bad_limit in (0, 1001):
+        response = await client.get("/data", params={"limit": bad_limit})
+        assert response.status_code == 422
+
+async def test_get_data_with_filter(client, mock_db):
+    """Test GET /data?filter= uses JSONB containment and bypasses cache"""
+    conn, pool = mock_db
+    conn.fetchval.return_value = (
+        b'{"count": 1, "data": [{"id": 1, "content": {"type": "order"}, "timestamp": "2024-01-01"}],'
+        b' "next_cursor": null}'
+    )
+
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+        response = await client.get("/data", params={"filter": '{"type": "order"}'})
+        assert response.status_code == 200
+        assert response.json()["count"] == 1
+        query, after_id, limit, content_filter = conn.fetchval.call_args[0]
+        assert "content @> $3" in query
+        assert content_filter == {"type": "order"}
+        mock_redis.assert_not_called()
+
+async def test_get_data_with_invalid_filter(client, mock_db):
+    """Test GET /data rejects filters that are not JSON objects"""
+    for bad_filter in ("not-json", "[1, 2]"):
+        response = await client.get("/data", params={"filter": bad_filter})
+        assert response.status_code == 400
+
+async def test_post_data_success(client, mock_db):
     """Test POST /data creates new entry"""
-    cursor, conn = mock_db
+    conn, pool = mock_db
     test_data = {"message": "test", "value": 42}
-    cursor.fetchone.return_value = {
-        "id": 1,
-        "content": test_data,
-        "timestamp": "2024-01-01T00:00:00"
-    }
+    conn.fetchval.return_value = created_row(1, test_data)
 
-    response = client.post("/data", json=test_data)
+    response = await client.post("/data", json=test_data)
     assert response.status_code == 200
     data = response.json()
     assert "id" in data
     assert "content" in data
+    assert data["content"] == test_data
+    conn.fetchval.assert_awaited_once_with(INSERT_ITEM_SQL, test_data)
 
-def test_post_data_empty(mock_db):
+async def test_post_data_empty(client, mock_db):
     """Test POST /data rejects empty data"""
-    response = client.post("/data", json={})
+    response = await client.post("/data", json={})
     assert response.status_code == 400
 
-def test_metrics_endpoint():
+async def test_post_data_bulk_success(client, mock_db):
+    """Test POST /data/bulk inserts all items in one query and invalidates cache"""
+    conn, pool = mock_db
+    items = [{"message": "a"}, {"message": "b"}]
+    conn.fetch.return_value = [{"id": 1}, {"id": 2}]
+
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+        redis_conn = mock_redis_client(keys=["data:0:100"])
+        mock_redis.return_value = redis_conn
+
+        response = await client.post("/data/bulk", json=items)
+        assert response.status_code == 200
+        assert response.json() == {"count": 2, "ids": [1, 2]}
+        conn.fetch.assert_awaited_once()
+        assert conn.fetch.call_args[0][1] == items
+        redis_conn.delete.assert_called_once_with("data:0:100")
+
+async def test_post_data_bulk_empty(client, mock_db):
+    """Test POST /data/bulk rejects an empty list or empty items"""
+    for body in ([], [{"message": "a"}, {}]):
+        response = await client.post("/data/bulk", json=body)
+        assert response.status_code == 400
+
+async def test_post_data_bulk_database_error(client, mock_db):
+    """Test POST /data/bulk handles database errors"""
+    conn, pool = mock_db
+    conn.fetch.side_effect = Exception("Database constraint violation")
+
+    response = await client.post("/data/bulk", json=[{"message": "a"}])
+    assert response.status_code == 500
+
+async def test_request_id_generated(client):
+    """Test a unique request ID is generated when none is supplied"""
+    from src.app import PROC_NONCE
+
+    first = (await client.get("/health")).headers["X-Request-ID"]
+    second = (await client.get("/health")).headers["X-Request-ID"]
+    assert first.startswith(PROC_NONCE)
+    assert second.startswith(PROC_NONCE)
+    assert first != second
+
+async def test_request_id_propagated(client):
+    """Test an incoming X-Request-ID header is echoed back"""
+    response = await client.get("/health", headers={"X-Request-ID": "trace-123"})
+    assert response.headers["X-Request-ID"] == "trace-123"
+
+async def test_metrics_endpoint(client):
     """Test Prometheus metrics endpoint is accessible"""
-    response = client.get("/metrics")
+    response = await client.get("/metrics")
     assert response.status_code == 200
     assert "python_info" in response.text or "http_requests" in response.text
 
-def test_get_data_with_redis_cache_hit(mock_db):
+async def test_metrics_exclude_probe_endpoints(client):
+    """Test /health and /metrics requests are not instrumented"""
+    await client.get("/health")
+    await client.get("/metrics")
+    response = await client.get("/metrics")
+    assert 'handler="/health"' not in response.text
+    assert 'handler="/metrics"' not in response.text
+
+def cache_entry(body):
+    """Build a cached page entry: hex ETag digest followed by zstd body"""
+    from src.app import page_etag
+    return page_etag(body).encode() + zstandard.ZstdCompressor().compress(body)
+
+async def test_get_data_with_redis_cache_hit(client, mock_db):
     """Test GET /data returns cached data on cache HIT"""
-    cursor, conn = mock_db
-    cached_data = '{"count": 1, "data": [{"id": 1, "content": {"test": "cached"}}]}'
+    conn, pool = mock_db
+    cached_body = b'{"count": 1, "data": [{"id": 1, "content": {"test": "cached"}}]}'
 
-    with patch('src.app.get_redis_connection') as mock_redis:
-        redis_conn = MagicMock()
-        redis_conn.get.return_value = cached_data
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+        redis_conn = mock_redis_client()
+        redis_conn.get.return_value = cache_entry(cached_body)
         mock_redis.return_value = redis_conn
 
-        response = client.get("/data")
+        response = await client.get("/data", headers={"Accept-Encoding": "identity"})
         assert response.status_code == 200
-        data = response.json()
-        assert data["count"] == 1
-        redis_conn.get.assert_called_once_with("data:all")
+        assert response.headers["content-type"] == "application/json"
+        assert "content-encoding" not in response.headers
+        assert response.content == cached_body
+        redis_conn.get.assert_called_once_with("data:0:100")
+        conn.fetchval.assert_not_called()
+
+async def test_get_data_cache_hit_zstd_passthrough(client, mock_db):
+    """Test GET /data sends the compressed cache entry as-is to zstd clients"""
+    conn, pool = mock_db
+    cached_body = b'{"count": 1, "data": [{"id": 1, "content": {"test": "cached"}}]}'
+    entry = cache_entry(cached_body)
+
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+        redis_conn = mock_redis_client()
+        redis_conn.get.return_value = entry
+        mock_redis.return_value = redis_conn
+
+        async with client.stream("GET", "/data", headers={"Accept-Encoding": "zstd"}) as response:
+            raw = b"".join([chunk async for chunk in response.aiter_raw()])
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "zstd"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert raw == entry[32:]
+
+@pytest.mark.parametrize("accept_encoding", ["zstd;q=0", "gzip, zstd; q=0.0", "*, zstd;q=0", "zstdx"])
+async def test_get_data_cache_hit_zstd_refused(client, mock_db, accept_encoding):
+    """Test GET /data decompresses for clients that refuse zstd via q=0 or don't list it"""
+    conn, pool = mock_db
+    cached_body = b'{"count": 1, "data": [{"id": 1, "content": {"test": "cached"}}]}'
+
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+        redis_conn = mock_redis_client()
+        redis_conn.get.return_value = cache_entry(cached_body)
+        mock_redis.return_value = redis_conn
+
+        response = await client.get("/data", headers={"Accept-Encoding": accept_encoding})
+        assert response.status_code == 200
+        assert response.headers.get("content-encoding") != "zstd"
+        assert response.content == cached_body
+
+async def test_get_data_cache_hit_zstd_accepted_with_quality(client, mock_db):
+    """Test GET /data sends zstd when it is listed with a non-zero quality"""
+    conn, pool = mock_db
+    cached_body = b'{"count": 1, "data": [{"id": 1, "content": {"test": "cached"}}]}'
 
-def test_get_data_with_redis_cache_miss(mock_db):
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+        redis_conn = mock_redis_client()
+        redis_conn.get.return_value = cache_entry(cached_body)
+        mock_redis.return_value = redis_conn
+
+        async with client.stream("GET", "/data", headers={"Accept-Encoding": "gzip;q=1.0, ZSTD;q=0.5"}) as response:
+            await response.aread()
+        assert response.headers["content-encoding"] == "zstd"
+
+@pytest.mark.parametrize("entry", [
+    b"",
+    b"0123abcd",
+    b"0" * 32,
+    b"0" * 32 + b"not a zstd frame",
+    cache_entry(ONE_ITEM_PAGE)[:-8],
+    b"\xff" * 32 + zstandard.ZstdCompressor().compress(b"{}"),
+])
+async def test_get_data_corrupt_cache_entry_is_miss(client, mock_db, entry):
+    """Test an undecodable cache entry falls back to the database and is rewritten"""
+    conn, pool = mock_db
+    conn.fetchval.return_value = ONE_ITEM_PAGE
+
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+        redis_conn = mock_redis_client()
+        redis_conn.get.return_value = entry
+        mock_redis.return_value = redis_conn
+
+        response = await client.get("/data", headers={"Accept-Encoding": "identity"})
+        assert response.status_code == 200
+        assert response.content == ONE_ITEM_PAGE
+        conn.fetchval.assert_called_once()
+        assert redis_conn.setex.call_args[0][2] == cache_entry(ONE_ITEM_PAGE)
+
+async def test_get_data_with_redis_cache_miss(client, mock_db):
     """Test GET /data fetches from DB on cache MISS and caches result"""
-    cursor, conn = mock_db
-    cursor.fetchall.return_value = [{"id": 1, "content": {"test": "data"}, "timestamp": "2024-01-01"}]
+    conn, pool = mock_db
+    conn.fetchval.return_value = ONE_ITEM_PAGE
 
-    with patch('src.app.get_redis_connection') as mock_redis:
-        redis_conn = MagicMock()
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+        redis_conn = mock_redis_client()
         redis_conn.get.return_value = None  # Cache MISS
         mock_redis.return_value = redis_conn
 
-        response = client.get("/data")
+        response = await client.get("/data")
         assert response.status_code == 200
         data = response.json()
         assert data["count"] == 1
         redis_conn.setex.assert_called_once()
+        # Cached value is the ETag digest plus the compressed response body
+        assert redis_conn.setex.call_args[0][2] == cache_entry(ONE_ITEM_PAGE)
+
+async def test_get_data_concurrent_misses_query_once(client, mock_db):
+    """Test concurrent cache misses for one page hit the database only once"""
+    import asyncio
+    from src.app import _cache_locks
+    conn, pool = mock_db
+    cache = {}
+
+    async def slow_fetchval(*args):
+        await asyncio.sleep(0.01)
+        return ONE_ITEM_PAGE
 
-def test_get_data_redis_unavailable(mock_db):
+    async def cache_get(key):
+        return cache.get(key)
+
+    async def cache_setex(key, ttl, value):
+        cache[key] = value
+
+    conn.fetchval.side_effect = slow_fetchval
+    redis_conn = mock_redis_client()
+    redis_conn.get.side_effect = cache_get
+    redis_conn.setex.side_effect = cache_setex
+
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+        mock_redis.return_value = redis_conn
+        responses = await asyncio.gather(*(client.get("/data") for _ in range(5)))
+
+    assert conn.fetchval.await_count == 1
+    assert all(response.content == ONE_ITEM_PAGE for response in responses)
+    assert "data:0:100" not in _cache_locks
+
+async def test_get_data_failed_miss_keeps_single_flight(client, mock_db):
+    """Test waiters and late arrivals share one lock after the holder's query fails"""
+    import asyncio
+    from src.app import _cache_locks, _cache_lock_refs
+    conn, pool = mock_db
+    in_flight = 0
+    max_in_flight = 0
+
+    async def failing_fetchval(*args):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        try:
+            await asyncio.sleep(0.05)
+            raise Exception("Database connection failed")
+        finally:
+            in_flight -= 1
+
+    async def delayed_get(delay):
+        await asyncio.sleep(delay)
+        return await client.get("/data")
+
+    conn.fetchval.side_effect = failing_fetchval
+    redis_conn = mock_redis_client()
+    redis_conn.get.return_value = None
+
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+        mock_redis.return_value = redis_conn
+        # The last request arrives while the first waiter is querying
+        responses = await asyncio.gather(*(delayed_get(d) for d in (0, 0.01, 0.07)))
+
+    assert all(response.status_code == 500 for response in responses)
+    assert max_in_flight == 1
+    assert "data:0:100" not in _cache_locks
+    assert "data:0:100" not in _cache_lock_refs
+
+async def test_get_data_etag_not_modified(client, mock_db):
+    """Test GET /data returns 304 when If-None-Match matches the page ETag"""
+    conn, pool = mock_db
+    conn.fetchval.return_value = ONE_ITEM_PAGE
+
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+        mock_redis.return_value = None
+
+        first = await client.get("/data", headers={"Accept-Encoding": "identity"})
+        etag = first.headers["ETag"]
+        assert first.headers["Cache-Control"] == "public, no-cache"
+        # GZipMiddleware may append its own token; the field is a set of names
+        assert {v.strip() for v in first.headers["Vary"].split(",")} == {"Accept-Encoding"}
+
+        second = await client.get("/data", headers={"If-None-Match": etag, "Accept-Encoding": "zstd"})
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["ETag"] == etag
+        assert second.headers["Vary"] == "Accept-Encoding"
+
+async def test_get_data_etag_changes_with_content(client, mock_db):
+    """Test GET /data returns the full body when the page has changed"""
+    conn, pool = mock_db
+    conn.fetchval.return_value = ONE_ITEM_PAGE
+
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+        mock_redis.return_value = None
+
+        etag = (await client.get("/data")).headers["ETag"]
+        conn.fetchval.return_value = b'{"count": 0, "data": [], "next_cursor": null}'
+
+        response = await client.get("/data", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert response.json()["count"] == 0
+
+async def test_get_data_redis_unavailable(client, mock_db):
     """Test GET /data works when Redis is unavailable (graceful degradation)"""
-    cursor, conn = mock_db
-    cursor.fetchall.return_value = [{"id": 1, "content": {"test": "data"}, "timestamp": "2024-01-01"}]
+    conn, pool = mock_db
+    conn.fetchval.return_value = ONE_ITEM_PAGE
 
-    with patch('src.app.get_redis_connection') as mock_redis:
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
         mock_redis.return_value = None  # Redis unavailable
 
-        response = client.get("/data")
+        response = await client.get("/data")
         assert response.status_code == 200
         data = response.json()
         assert data["count"] == 1
 
-def test_get_data_redis_read_error(mock_db):
+async def test_get_data_redis_read_error(client, mock_db):
     """Test GET /data handles Redis read errors gracefully"""
-    cursor, conn = mock_db
-    cursor.fetchall.return_value = [{"id": 1, "content": {"test": "data"}, "timestamp": "2024-01-01"}]
+    conn, pool = mock_db
+    conn.fetchval.return_value = ONE_ITEM_PAGE
 
-    with patch('src.app.get_redis_connection') as mock_redis:
-        redis_conn = MagicMock()
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+        redis_conn = mock_redis_client()
         redis_conn.get.side_effect = Exception("Redis connection error")
         mock_redis.return_value = redis_conn
 
-        response = client.get("/data")
+        response = await client.get("/data")
         assert response.status_code == 200
         data = response.json()
         assert data["count"] == 1
 
-def test_post_data_invalidates_cache(mock_db):
+async def test_post_data_invalidates_cache(client, mock_db):
     """Test POST /data invalidates Redis cache"""
-    cursor, conn = mock_db
+    conn, pool = mock_db
     test_data = {"message": "test"}
-    cursor.fetchone.return_value = {
-        "id": 1,
-        "content": test_data,
-        "timestamp": "2024-01-01T00:00:00"
-    }
-
-    with patch('src.app.get_redis_connection') as mock_redis:
-        redis_conn = MagicMock()
+    conn.fetchval.return_value = created_row(1, test_data)
+
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+        redis_conn = mock_redis_client(keys=["data:0:100", "data:100:100"])
         mock_redis.return_value = redis_conn
 
-        response = client.post("/data", json=test_data)
+        response = await client.post("/data", json=test_data)
         assert response.status_code == 200
-        redis_conn.delete.assert_called_once_with("data:all")
+        redis_conn.scan_iter.assert_called_once_with(match="data:*")
+        redis_conn.delete.assert_called_once_with("data:0:100", "data:100:100")
 
-def test_post_data_redis_unavailable(mock_db):
+async def test_post_data_redis_unavailable(client, mock_db):
     """Test POST /data works when Redis is unavailable"""
-    cursor, conn = mock_db
+    conn, pool = mock_db
     test_data = {"message": "test"}
-    cursor.fetchone.return_value = {
-        "id": 1,
-        "content": test_data,
-        "timestamp": "2024-01-01T00:00:00"
-    }
+    conn.fetchval.return_value = created_row(1, test_data)
 
-    with patch('src.app.get_redis_connection') as mock_redis:
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
         mock_redis.return_value = None  # Redis unavailable
 
-        response = client.post("/data", json=test_data)
+        response = await client.post("/data", json=test_data)
         assert response.status_code == 200
 
-def test_get_data_database_unavailable():
+async def test_get_data_database_unavailable(client):
     """Test GET /data handles database connection failure"""
-    with patch('src.app.get_db_connection') as mock_db:
+    with patch('src.app.get_db_pool', new_callable=AsyncMock) as mock_db:
         mock_db.return_value = None  # Database unavailable
 
-        response = client.get("/data")
+        response = await client.get("/data")
         assert response.status_code == 503
         assert "Database connection unavailable" in response.json()["detail"]
 
-def test_post_data_database_unavailable():
+async def test_post_data_database_unavailable(client):
     """Test POST /data handles database connection failure"""
     test_data = {"message": "test"}
 
-    with patch('src.app.get_db_connection') as mock_db:
+    with patch('src.app.get_db_pool', new_callable=AsyncMock) as mock_db:
         mock_db.return_value = None  # Database unavailable
 
-        response = client.post("/data", json=test_data)
+        response = await client.post("/data", json=test_data)
         assert response.status_code == 503
         assert "Database connection unavailable" in response.json()["detail"]
 
-def test_get_data_redis_write_error(mock_db):
+async def test_get_data_redis_write_error(client, mock_db):
     """Test GET /data handles Redis write (setex) errors gracefully"""
-    cursor, conn = mock_db
-    cursor.fetchall.return_value = [{"id": 1, "content": {"test": "data"}, "timestamp": "2024-01-01"}]
+    conn, pool = mock_db
+    conn.fetchval.return_value = ONE_ITEM_PAGE
 
-    with patch('src.app.get_redis_connection') as mock_redis:
-        redis_conn = MagicMock()
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+        redis_conn = mock_redis_client()
         redis_conn.get.return_value = None  # Cache MISS
         redis_conn.setex.side_effect = Exception("Redis write error")  # Write fails
         mock_redis.return_value = redis_conn
 
-        response = client.get("/data")
+        response = await client.get("/data")
         assert response.status_code == 200  # Should still succeed
         data = response.json()
         assert data["count"] == 1
 
-def test_post_data_redis_delete_error(mock_db):
+async def test_post_data_redis_delete_error(client, mock_db):
     """Test POST /data handles Redis delete errors gracefully"""
-    cursor, conn = mock_db
+    conn, pool = mock_db
     test_data = {"message": "test"}
-    cursor.fetchone.return_value = {
-        "id": 1,
-        "content": test_data,
-        "timestamp": "2024-01-01T00:00:00"
-    }
-
-    with patch('src.app.get_redis_connection') as mock_redis:
-        redis_conn = MagicMock()
+    conn.fetchval.return_value = created_row(1, test_data)
+
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+        redis_conn = mock_redis_client()
         redis_conn.delete.side_effect = Exception("Redis delete error")  # Delete fails
         mock_redis.return_value = redis_conn
 
-        response = client.post("/data", json=test_data)
+        response = await client.post("/data", json=test_data)
         assert response.status_code == 200  # Should still succeed
 
-def test_post_data_database_error(mock_db):
-    """Test POST /data handles database errors with rollback"""
-    cursor, conn = mock_db
+async def test_post_data_database_error(client, mock_db):
+    """Test POST /data handles database errors"""
+    conn, pool = mock_db
     test_data = {"message": "test"}
-    cursor.execute.side_effect = Exception("Database constraint violation")
+    conn.fetchval.side_effect = Exception("Database constraint violation")
 
-    response = client.post("/data", json=test_data)
+    response = await client.post("/data", json=test_data)
     assert response.status_code == 500
-    conn.rollback.assert_called_once()
+    assert "Database error" in response.json()["detail"]
 
-def test_get_data_database_query_error(mock_db):
+async def test_get_data_database_query_error(client, mock_db):
     """Test GET /data handles database query errors"""
-    cursor, conn = mock_db
-    cursor.execute.side_effect = Exception("Database query error")
+    conn, pool = mock_db
+    conn.fetchval.side_effect = Exception("Database query error")
 
-    with patch('src.app.get_redis_connection') as mock_redis:
-        redis_conn = MagicMock()
+    with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+        redis_conn = mock_redis_client()
         redis_conn.get.return_value = None  # Force DB query
         mock_redis.return_value = redis_conn
 
-        response = client.get("/data")
+        response = await client.get("/data")
         assert response.status_code == 500
 
-def test_redis_connection_success():
+async def test_redis_connection_success():
     """Test Redis connection success path"""
-    with patch('redis.from_url') as mock_redis_from_url:
-        redis_conn = MagicMock()
-        redis_conn.ping.return_value = True
-        mock_redis_from_url.return_value = redis_conn
+    import redis.asyncio
+    import src.app
+    src.app.redis_client = None
 
-        # Import to trigger connection
-        from src.app import get_redis_connection
-        result = get_redis_connection()
+    with patch('redis.asyncio.Redis.ping', new_callable=AsyncMock) as mock_ping:
+        result = await src.app.get_redis_connection()
 
         assert result is not None
-        redis_conn.ping.assert_called_once()
-
-def test_redis_connection_failure():
+        mock_ping.assert_awaited_once()
+        # Blocking pool: a burst waits for a free connection instead of failing
+        pool = result.connection_pool
+        assert isinstance(pool, redis.asyncio.BlockingConnectionPool)
+        assert pool.max_connections == src.app.REDIS_MAX_CONNECTIONS
+        assert pool.timeout == src.app.REDIS_POOL_TIMEOUT
+        assert pool.connection_kwargs["decode_responses"] is False
+
+    await result.aclose()
+    src.app.redis_client = None
+
+async def test_redis_connection_failure():
     """Test Redis connection failure handling"""
-    with patch('redis.from_url') as mock_redis_from_url:
-        mock_redis_from_url.side_effect = Exception("Redis connection refused")
+    import src.app
 
-        # Import to trigger connection
-        from src.app import get_redis_connection
+    with patch('redis.asyncio.Redis.ping', new_callable=AsyncMock) as mock_ping:
+        mock_ping.side_effect = Exception("Redis connection refused")
 
         # Reset global redis_client
-        import src.app
         src.app.redis_client = None
 
-        result = get_redis_connection()
+        result = await src.app.get_redis_connection()
+        assert result is None
+
+async def test_db_pool_success():
+    """Test database pool creation creates the table"""
+    import src.app
+    src.app.db_pool = None
+
+    pool = MagicMock()
+    conn = MagicMock()
+    conn.execute = AsyncMock()
+    pool.acquire.return_value.__aenter__.return_value = conn
+
+    with patch('asyncpg.create_pool', new_callable=AsyncMock) as mock_create_pool:
+        mock_create_pool.return_value = pool
+
+        result = await src.app.get_db_pool()
+
+        assert result is pool
+        assert mock_create_pool.call_args.kwargs["min_size"] == src.app.DB_POOL_MIN_SIZE
+        assert mock_create_pool.call_args.kwargs["max_size"] == src.app.DB_POOL_MAX_SIZE
+        statements = [call[0][0] for call in conn.execute.call_args_list]
+        assert "CREATE TABLE IF NOT EXISTS data_items" in statements[0]
+        assert "USING GIN (content jsonb_path_ops)" in statements[1]
+
+    src.app.db_pool = None
+
+async def test_db_pool_created_once_under_concurrency():
+    """Test concurrent callers share a single pool instead of each creating one"""
+    import asyncio
+    import src.app
+    src.app.db_pool = None
+
+    pool = MagicMock()
+    pool.acquire.return_value.__aenter__.return_value.execute = AsyncMock()
+
+    async def slow_create_pool(*args, **kwargs):
+        await asyncio.sleep(0.01)
+        return pool
+
+    with patch('asyncpg.create_pool', side_effect=slow_create_pool) as mock_create_pool:
+        results = await asyncio.gather(*(src.app.get_db_pool() for _ in range(20)))
+
+    assert all(result is pool for result in results)
+    assert mock_create_pool.call_count == 1
+
+    src.app.db_pool = None
+
+async def test_db_pool_failure_not_retried_by_waiters():
+    """Test callers queued behind a failed attempt return None instead of retrying"""
+    import asyncio
+    import src.app
+    src.app.db_pool = None
+
+    async def slow_failing_create_pool(*args, **kwargs):
+        await asyncio.sleep(0.01)
+        raise Exception("Connection refused")
+
+    with patch('asyncpg.create_pool', side_effect=slow_failing_create_pool) as mock_create_pool:
+        results = await asyncio.gather(*(src.app.get_db_pool() for _ in range(5)))
+
+        assert results == [None] * 5
+        assert mock_create_pool.call_count == 1
+        assert mock_create_pool.call_args.kwargs["timeout"] == src.app.DB_CONNECT_TIMEOUT
+
+        # A later request makes a fresh attempt
+        assert await src.app.get_db_pool() is None
+        assert mock_create_pool.call_count == 2
+
+async def test_db_pool_failure():
+    """Test database pool creation failure handling"""
+    import src.app
+    src.app.db_pool = None
+
+    with patch('asyncpg.create_pool', new_callable=AsyncMock) as mock_create_pool:
+        mock_create_pool.side_effect = Exception("Connection refused")
+
+        result = await src.app.get_db_pool()
         assert result is None
+
+async def test_db_pool_closed_on_shutdown():
+    """Test database pool is closed when the app shuts down"""
+    import src.app
+
+    pool = MagicMock()
+    pool.close = AsyncMock()
+
+    with patch('src.app.get_db_pool', new_callable=AsyncMock) as mock_get_pool:
+        src.app.db_pool = pool
+        async with app.router.lifespan_context(app):
+            mock_get_pool.assert_awaited_once()
+
+    pool.close.assert_awaited_once()
+    assert src.app.db_pool is None
+
+async def test_json_log_formatter():
+    """Test log records are rendered as JSON with the current request ID"""
+    import logging
+    from src.app import FastJsonFormatter, request_id_context
+
+    record = logging.LogRecord("src.app", logging.INFO, __file__, 1, "Created %d items", (2,), None)
+    token = request_id_context.set("trace-123")
+    try:
+        log_data = json.loads(FastJsonFormatter().format(record))
+    finally:
+        request_id_context.reset(token)
+
+    assert log_data["level"] == "INFO"
+    assert log_data["logger"] == "src.app"
+    assert log_data["message"] == "Created 2 items"
+    assert log_data["request_id"] == "trace-123"
+    assert log_data["timestamp"] == record.created
+
+async def test_json_log_formatter_extra_fields():
+    """Test fields passed via extra= are included in the JSON line"""
+    import logging
+    from src.app import FastJsonFormatter
+
+    record = logging.makeLogRecord({"name": "src.app", "msg": "request", "levelname": "INFO"})
+    record.__dict__.update(method="GET", status=200)
+    log_data = json.loads(FastJsonFormatter().format(record))
+
+    assert log_data["method"] == "GET"
+    assert log_data["status"] == 200
+    assert "args" not in log_data
+
+async def test_access_log_single_record_per_request(client, mock_db):
+    """Test each request emits exactly one access log record with cache outcome"""
+    import logging
+    from src.app import logger
+
+    conn, pool = mock_db
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger.addHandler(handler)
+    try:
+        with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+            redis_conn = mock_redis_client()
+            redis_conn.get.return_value = cache_entry(ONE_ITEM_PAGE)
+            mock_redis.return_value = redis_conn
+
+            response = await client.get("/data")
+    finally:
+        logger.removeHandler(handler)
+
+    assert response.status_code == 200
+    assert len(records) == 1
+    record = records[0]
+    assert record.getMessage() == "request"
+    assert (record.method, record.path, record.status, record.cache) == ("GET", "/data", 200, "HIT")
+    assert record.dur_ms >= 0
+
+async def test_access_log_skips_probe_and_scrape_paths(client):
+    """Test /health and /metrics requests don't emit access log records"""
+    import logging
+    from src.app import logger
+
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger.addHandler(handler)
+    try:
+        await client.get("/health")
+        await client.get("/metrics")
+    finally:
+        logger.removeHandler(handler)
+
+    assert not [record for record in records if record.getMessage() == "request"]
+
+async def test_access_log_on_unhandled_exception(client):
+    """Test a request whose handler raises still emits one access log record"""
+    import logging
+    from src.app import logger
+
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger.addHandler(handler)
+    try:
+        with patch('src.app.get_redis_connection', new_callable=AsyncMock) as mock_redis:
+            mock_redis.side_effect = RuntimeError("unexpected failure")
+
+            with pytest.raises(RuntimeError):
+                await client.get("/data")
+    finally:
+        logger.removeHandler(handler)
+
+    access_records = [record for record in records if record.getMessage() == "request"]
+    assert len(access_records) == 1
+    assert (access_records[0].path, access_records[0].status) == ("/data", 500)
+
+async def test_large_page_compression_offloaded():
+    """Test large pages are (de)compressed in a worker thread and round-trip"""
+    import asyncio
+    from src.app import compress_page, decompress_page, ZSTD_THREAD_MIN_SIZE
+
+    small = b'{"count": 0, "data": [], "next_cursor": null}'
+    large = b'{"data": "' + b"x" * ZSTD_THREAD_MIN_SIZE + b'"}'
+
+    async def round_trip(body):
+        return await decompress_page(await compress_page(body))
+
+    with patch('src.app.asyncio.to_thread', wraps=asyncio.to_thread) as mock_to_thread:
+        assert await round_trip(small) == small
+        mock_to_thread.assert_not_called()
+
+        assert await round_trip(large) == large
+        assert mock_to_thread.call_count == 2
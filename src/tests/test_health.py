@@ -1,11 +1,10 @@
-from fastapi.testclient import TestClient
-from src.app import app
+import pytest
 
-client = TestClient(app)
+pytestmark = pytest.mark.asyncio(loop_scope="session")
 
-def test_health_endpoint():
+async def test_health_endpoint(client):
     """Test health check returns 200 and correct structure"""
-    response = client.get("/health")
+    response = await client.get("/health")
     assert response.status_code == 200
     data = response.json()
     assert "status" in data
@@ -13,10 +12,20 @@ def test_health_endpoint():
     assert "timestamp" in data
     assert "service" in data
 
-def test_health_response_time():
+async def test_health_response_time(client):
     """Test health check responds quickly"""
     import time
     start = time.time()
-    client.get("/health")
+    await client.get("/health")
     duration = time.time() - start
     assert duration < 1.0  # Should respond in less than 1 second
+
+async def test_health_body_reused_within_a_second(client):
+    """Test health check serves the cached body between refreshes"""
+    import src.app
+    src.app._HEALTH_CACHE["ts"] = float("-inf")
+
+    first = await client.get("/health")
+    second = await client.get("/health")
+    assert second.headers["content-type"] == "application/json"
+    assert first.content == second.content